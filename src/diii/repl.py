@@ -53,6 +53,14 @@ diii_help = """
 
 last_script = ''
 
+# once the transcript grows past output_max_len characters the oldest lines
+# are dropped, keeping roughly the last output_keep_len characters
+output_max_len = 1000000
+output_keep_len = 500000
+# the capture fields only ever show their last couple of lines
+capture_max_len = 10000
+capture_keep_len = 1000
+
 class DiiiUi:
     def __init__(self, use_theme):
         self.statusbar = Window(
@@ -137,8 +145,22 @@ class UiPage(ABC):
         pass
 
     def output_to_field(self, field, st):
-        s = field.text + st.replace('\r', '')
-        field.buffer.document = Document(text=s, cursor_position=len(s))
+        buf = field.buffer
+        buf.cursor_position = len(buf.text)
+        buf.insert_text(st)
+        if len(buf.text) > capture_max_len:
+            self.trim_field(field, capture_keep_len)
+
+    def trim_field(self, field, keep_len):
+        # drop whole lines from the start, keeping about keep_len characters
+        text = field.buffer.text
+        start = len(text) - keep_len
+        nl = text.find('\n', start)
+        if nl >= 0:
+            start = nl + 1
+        text = text[start:]
+        field.buffer.document = Document(text=text, cursor_position=len(text))
+        return len(text)
 
     def mount(self):
         self.arrange_ui(self.ui.content)
@@ -166,6 +188,13 @@ class ReplCompleter(Completer):
             meta_dict=self.III_COMMANDS,
         )
 
+        # line prefix -> (completer, whether to skip spaces after the prefix)
+        self._dispatch = {
+            '^^': (self.word_completer, False),
+            'r ': (self.path_completer, True),
+            'u ': (self.path_completer, True),
+        }
+
     def offset_document(self, document, offset):
         move_cursor = len(document.current_line) - offset
         return Document(
@@ -175,26 +204,28 @@ class ReplCompleter(Completer):
 
     def get_completions(self, document, complete_event):
         line = document.current_line.lstrip()
-        offset = len(document.current_line) - len(line)
-
-        if line.startswith('^^'):
-            line = line[2:]
-            offset += 2
-            new_document = self.offset_document(document, offset)
-            yield from self.word_completer.get_completions(new_document, complete_event)
-        elif line.startswith('r ') or line.startswith('u '):
-            line = line[2:]
-            offset += 2
-            rem = line.lstrip()
-            offset += len(line) - len(rem)
-            new_document = self.offset_document(document, offset)
-            yield from self.path_completer.get_completions(new_document, complete_event)
+        entry = self._dispatch.get(line[:2])
+        if entry is None:
+            return
+        completer, skip_spaces = entry
+        offset = len(document.current_line) - len(line) + 2
+        if skip_spaces:
+            rest = line[2:]
+            offset += len(rest) - len(rest.lstrip())
+        new_document = self.offset_document(document, offset)
+        yield from completer.get_completions(new_document, complete_event)
 
 
 class DiiiRepl(UiPage):
     def __init__(self, ui, iii):
         self.iii = iii
         self.completer = ReplCompleter()
+        self._cmds = {
+            'u': self._cmd_upload,
+            'q': self._cmd_quit,
+            'p': self._cmd_print,
+            'h': self._cmd_help,
+        }
         super().__init__(ui)
 
         on_disconnect = lambda exc: self.output('  <device disconnected>\n')
@@ -221,6 +252,7 @@ class DiiiRepl(UiPage):
             text=diii_intro,
             scrollbar=True,
         )
+        self._output_len = len(diii_intro)
         self.output_field.window.right_margins[0].display_arrows = to_filter(False)
         self.input_field = TextArea(
             height=1,
@@ -254,8 +286,15 @@ class DiiiRepl(UiPage):
         self.ui.layout.focus(self.input_field)
 
     def output(self, st):
-        self.output_field.buffer.cursor_position = len(self.output_field.buffer.text)
-        self.output_field.buffer.insert_text(st.replace('\r', ''))
+        buffer = self.output_field.buffer
+        buffer.cursor_position = self._output_len
+        buffer.insert_text(st)
+        self._output_len += len(st)
+        if self._output_len > output_max_len:
+            self.trim_output()
+
+    def trim_output(self):
+        self._output_len = self.trim_field(self.output_field, output_keep_len)
 
     def accept(self, buff):
         self.output(f'\n> {self.input_field.text}\n')
@@ -265,32 +304,39 @@ class DiiiRepl(UiPage):
         parts = cmd.split(maxsplit=1)
         if len(parts) == 0:
             return
-        c = parts[0]
-        if c == 'u':
-            run_func = self.iii.upload
-            global last_script
-            if len(parts) == 1:
-                if len(last_script) == 0:
-                    self.output('  u <filename> to upload script')
-                else:
-                    run_func(last_script)
-            elif len(parts) == 2 and os.path.isfile(parts[1]):
-                last_script = parts[1]
-                run_func(parts[1])
-            else:
-                self.iii.writeline(cmd)
-        elif len(parts) == 1:
-            if c == 'q':
-                print('bye.')
-                get_app().exit()
-            elif c == 'p':
-                self.iii.writeline('^^p')
-            elif c == 'h':
-                self.output(diii_help)
+        # handlers return False to fall through to sending the raw line
+        handler = self._cmds.get(parts[0])
+        if handler is None or handler(*parts[1:]) is False:
+            self.iii.writeline(cmd)
+
+    def _cmd_upload(self, fname=None):
+        global last_script
+        if fname is None:
+            if len(last_script) == 0:
+                self.output('  u <filename> to upload script')
             else:
-                self.iii.writeline(cmd)
+                self.iii.upload(last_script)
+        elif os.path.isfile(fname):
+            last_script = fname
+            self.iii.upload(fname)
         else:
-            self.iii.writeline(cmd)
+            return False
+
+    def _cmd_quit(self, arg=None):
+        if arg is not None:
+            return False
+        print('bye.')
+        get_app().exit()
+
+    def _cmd_print(self, arg=None):
+        if arg is not None:
+            return False
+        self.iii.writeline('^^p')
+
+    def _cmd_help(self, arg=None):
+        if arg is not None:
+            return False
+        self.output(diii_help)
 
     def iii_event(self, line, event, args):
         if event == 'stream' or event == 'change':
@@ -403,7 +449,7 @@ def main(script=None, use_theme=True):
             shell = Diii(iii, use_theme)
 
             server = DiiiServer(shell.repl, 'localhost', 6666)
-            iii.reconnect(err_event=True)
+            loop.run_until_complete(iii.reconnect(err_event=True))
             background_task = asyncio.gather(
                 shell.background(),
                 server.listen(),
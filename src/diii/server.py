@@ -20,7 +20,8 @@ class DiiiServer:
         )
         try:
             async for message in websocket:
-                self.repl.output(f'\n> {message}\n')
+                line = message.replace('\r', '')
+                self.repl.output(f'\n> {line}\n')
                 self.repl.iii.writeline(message)
         except ConnectionClosedError as e:
             #self.repl.output(f'\n <ws disconnected: {host} ({e.code} {e.reason or "no reason"})>')
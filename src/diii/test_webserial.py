@@ -8,14 +8,17 @@ async def echo(websocket):
     - Enters a loop to receive messages from the client.
     - If the message is "REQUEST_RESPONSE", it sends back a specific response.
     - Otherwise, it echoes the received message back to the client.
+    - Replies are always sent as binary frames, as the device does.
     - Prints a message when the client disconnects.
     """
     print(f"Server: Client connected: {websocket.remote_address}")
     try:
         async for message in websocket:
             print(f"Server received: {message}")
-            if message == "REQUEST_RESPONSE":
-                await websocket.send(f"This is the server's response.\n")
+            if isinstance(message, str):
+                message = message.encode('utf-8')
+            if message.strip() == b"REQUEST_RESPONSE":
+                await websocket.send(b"This is the server's response.\n")
             else:
                 await websocket.send(message)  # Echo back the message
     except websockets.ConnectionClosed as e:
@@ -1,16 +1,17 @@
 import asyncio
+import codecs
 import logging
-import time
 import os
 import websockets
 import datetime
+import re
 import socket
 
 import serial
 import serial.tools.list_ports
 
 from diii.exceptions import DeviceNotFoundError
-from diii.websocketserial import WebSocketSerialThreaded
+from diii.websocketserial import WebSocketSerialAsync
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +20,10 @@ class Deviceviii:
         self.serial = None
         self.is_connected = False
         self.event_handlers = {}
+        self._leftover = ''
+        # keeps multi-byte characters that straddle two reads intact
+        self._utf8 = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._evt_re = re.compile(r'\^\^(\w+)(?:\(([^)]*)\))?')
 
     def __enter__(self):
         return self
@@ -27,10 +32,12 @@ class Deviceviii:
         if self.is_connected:
             self.disconnect()
 
-    def connect(self):
-        # self.serial = WebSocketSerialThreaded('localhost', 8765)
-        self.serial = WebSocketSerialThreaded("ws://localhost:8765", timeout=0.5)
-        self.serial.open()
+    async def connect(self):
+        # drop any partial line or character left over from a previous connection
+        self._utf8.reset()
+        self._leftover = ''
+        self.serial = WebSocketSerialAsync("ws://localhost:8765", timeout=0.5)
+        await self.serial.open()
         logger.info(f'connected to device on {self.serial.port}')
 
     def disconnect(self):
@@ -55,9 +62,9 @@ class Deviceviii:
         # if self.serial is not None:
             # self.serial.event_handlers = handlers
 
-    def reconnect(self, err_event=False):
+    async def reconnect(self, err_event=False):
         try:
-            self.connect()
+            await self.connect()
             if self.serial is not None and self.serial.is_open():
                 self.is_connected = True
                 self.raise_event('connect')
@@ -66,35 +73,48 @@ class Deviceviii:
                 self.is_connected = False
                 self.raise_event('connect_err', exc)
 
-    def writebin(self, b):
+    def writebin(self, *parts):
         if self.serial is not None:
-            if len(b) % 64 == 0:
-                b += b'\n'
-            logger.debug(f'-> {b}')
+            # assemble the frame, padding included, with a single join
+            if sum(map(len, parts)) % 64 == 0:
+                parts += (b'\n',)
+            b = b''.join(parts)
+            logger.debug('-> %r', b)
             self.serial.write(b)
 
     def write(self, s):
         self.writebin(s.encode('utf-8'))
 
     def writeline(self, line):
-        self.write(line + '\r\n')
+        self.writebin(line.encode('utf-8'), b'\r\n')
 
-    def writefile(self, fname):
-        with open(fname) as f:
+    def _read_script(self, fname):
+        with open(fname, 'rb') as f:
             logger.info(f'opened file: {f}')
-            for line in f.readlines():
-                self.writeline(line.rstrip())
-                time.sleep(0.001)
+            data = f.read()
+        # the device expects \r\n line endings; only undo existing ones if
+        # there are any, saving a full copy for files with unix newlines
+        if b'\r' in data:
+            data = data.replace(b'\r\n', b'\n')
+        return data.replace(b'\n', b'\r\n')
+
+    def writefile(self, fname):
+        data = self._read_script(fname)
+        if data.endswith(b'\r\n'):
+            self.writebin(data)
+        else:
+            self.writebin(data, b'\r\n')
+
+    def upload_bytes(self, header, body, footer):
+        # send the markers and script as a single frame
+        parts = (header, b'\r\n', body)
+        if not body.endswith(b'\r\n'):
+            parts += (b'\r\n',)
+        self.writebin(*parts, footer, b'\r\n^^z\r\n')
 
     def _upload(self, fname, event, end):
         self.raise_event(event, fname)
-        self.writeline('^^s')
-        time.sleep(0.1)
-        self.writefile(fname)
-        time.sleep(0.1)
-        self.writeline(end)
-        time.sleep(0.1)
-        self.writeline('^^z')
+        self.upload_bytes(b'^^s', self._read_script(fname), end.encode('utf-8'))
 
     def execute(self, fname):
         self._upload(fname, 'running', '^^e')
@@ -102,43 +122,48 @@ class Deviceviii:
     def upload(self, fname):
         self._upload(fname, 'uploading', '^^w')
 
-    def readbin(self, count):
+    def readbin(self, count=None):
         b = b''
         if self.serial is not None:
-            b = self.serial.read(count)
+            b = self.serial.read_available(count)
         if len(b) > 0:
-            logger.debug(f'<- {b}')
+            logger.debug('<- %r', b)
         return b
 
-    def read(self, count):
-        return self.readbin(count).decode('utf-8')
+    def read(self, count=None):
+        # drop the device's \r before decoding so nothing downstream has to
+        return self._utf8.decode(self.readbin(count).translate(None, b'\r'))
+
+    def _split_lines(self, r):
+        lines = (self._leftover + r).split('\n')
+        # the last piece is an incomplete line until its separator arrives
+        self._leftover = lines.pop()
+        return lines
 
     async def read_forever(self):
         while True:
-            sleeptime = 0.001
-            try:
-                r = self.read(10000)
-                r = ""
-                if len(r) > 0:
-                    lines = r.split('\n\r')
-                    for line in lines:
+            if self.is_connected:
+                try:
+                    await self.serial.rx_ready.wait()
+                    for line in self._split_lines(self.read()):
                         self.process_line(line)
-            except Exception as exc:
-                if self.is_connected:
+                    continue
+                except Exception as exc:
                     logger.error(f'lost connection: {exc}')
-                sleeptime = 0.1
-                self.reconnect()
-            await asyncio.sleep(sleeptime)
+            await self.reconnect()
+            await asyncio.sleep(0.1)
 
     def process_line(self, line):
-        if "^^" in line:
-            cmds = line.split('^^')
-            for cmd in cmds:
-                t3 = cmd.rstrip().partition('(')
-                if not any(t3):
-                    continue
-                evt = t3[0]
-                args = t3[2].rstrip(')').split(',')
-                self.raise_event('iii_event', line, evt, args)
-        elif len(line) > 0:
+        idx = line.find('^^')
+        if idx < 0:
+            if len(line) > 0:
+                self.raise_event('iii_output', line)
+            return
+        matched = False
+        for m in self._evt_re.finditer(line, idx):
+            matched = True
+            evt = m.group(1)
+            args = (m.group(2) or '').split(',')
+            self.raise_event('iii_event', line, evt, args)
+        if not matched:
             self.raise_event('iii_output', line)
@@ -1,18 +1,23 @@
 import asyncio
-import threading
-import queue
 import websockets
 from io import BytesIO
 import serial.serialutil  # For SerialException
 
-class WebSocketSerialThreaded:
+class WebSocketSerialAsync:
     """
-    A class that mimics the interface of serial.Serial but uses a WebSocket
-    connection managed in a separate thread with asyncio. Communication
-    with the calling thread is done via synchronized queues.
+    A class that mimics the interface of serial.Serial but runs its WebSocket
+    connection as tasks on the caller's asyncio event loop. write() queues
+    data for the sender task without waiting; received data is appended to
+    a buffer that the read methods slice from.
+
+    The device speaks ASCII over binary frames, so received frames are
+    expected to be bytes; text frames are still accepted and encoded.
+
+    rx_ready is an asyncio.Event that is set whenever data arrives or the
+    connection ends, and cleared by read_available().
     """
 
-    def __init__(self, url, baudrate=9600, bytesize=8, parity='N', stopbits=1, timeout=None, xonxoff=False, rtscts=False, dsrdtr=False, **kwargs):
+    def __init__(self, url, baudrate=9600, bytesize=8, parity='N', stopbits=1, timeout=None, xonxoff=False, rtscts=False, dsrdtr=False, connect_timeout=5, **kwargs):
         self.url = url
         self.baudrate = baudrate
         self.bytesize = bytesize
@@ -22,136 +27,176 @@ class WebSocketSerialThreaded:
         self.xonxoff = xonxoff
         self.rtscts = rtscts
         self.dsrdtr = dsrdtr
+        self.connect_timeout = connect_timeout
         self._is_open = False
-        self._read_queue = queue.Queue()
-        self._write_queue = queue.Queue()
-        self._event_loop = None
-        self._thread = None
-        self._stop_event = threading.Event()
-
-    def _run_websocket_loop(self):
-        async def websocket_handler():
+        self._rx_buf = bytearray()
+        self.rx_ready = None
+        self._write_queue = None
+        self._connected = None
+        self._task = None
+
+    async def _sender(self, websocket):
+        while True:
             try:
-                async with websockets.connect(self.url) as websocket:
-                    print(f"WebSocketThread: Connected to {self.url}")
-                    self._is_open = True
-
-                    async def sender():
-                        while not self._stop_event.is_set():
-                            try:
-                                data_to_send = self._write_queue.get(timeout=0.1)
-                                await websocket.send(data_to_send)
-                                # print(f"WebSocketThread: Sent {data_to_send}")
-                            except queue.Empty:
-                                await asyncio.sleep(0.01)
-                            except websockets.exceptions.ConnectionClosedOK:
-                                print("WebSocketThread: Server closed connection gracefully (send).")
-                                break
-                            except websockets.exceptions.ConnectionClosedError as e:
-                                print(f"WebSocketThread: Server closed connection unexpectedly (send): {e}")
-                                break
-                            except Exception as e:
-                                print(f"WebSocketThread: Error during send: {e}")
-                                break
-
-                    async def receiver():
-                        while not self._stop_event.is_set():
-                            try:
-                                received = await websocket.recv()
-                                if isinstance(received, str):
-                                    self._read_queue.put(received.encode('utf-8'))
-                                elif isinstance(received, bytes):
-                                    self._read_queue.put(received)
-                                # print(f"WebSocketThread: Received {received}")
-                            except websockets.exceptions.ConnectionClosedOK:
-                                print("WebSocketThread: Server closed connection gracefully (recv).")
-                                break
-                            except websockets.exceptions.ConnectionClosedError as e:
-                                print(f"WebSocketThread: Server closed connection unexpectedly (recv): {e}")
-                                break
-                            except Exception as e:
-                                print(f"WebSocketThread: Error during receive: {e}")
-                                break
-                            await asyncio.sleep(0.01)
-
-                    await asyncio.gather(sender(), receiver())
-
-            # except websockets.exceptions.ConnectionRefusedError:
-                # print(f"WebSocketThread: Connection refused to {self.url}")
+                data_to_send = await self._write_queue.get()
+                await websocket.send(data_to_send)
+                # print(f"WebSocketSerial: Sent {data_to_send}")
+            except websockets.exceptions.ConnectionClosedOK:
+                print("WebSocketSerial: Server closed connection gracefully (send).")
+                break
+            except websockets.exceptions.ConnectionClosedError as e:
+                print(f"WebSocketSerial: Server closed connection unexpectedly (send): {e}")
+                break
             except Exception as e:
-                print(f"WebSocketThread: Error in WebSocket loop: {e}")
-            finally:
-                self._is_open = False
-                print(f"WebSocketThread: WebSocket loop finished.")
+                print(f"WebSocketSerial: Error during send: {e}")
+                break
 
-        self._event_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self._event_loop)
-        self._event_loop.run_until_complete(websocket_handler())
+    async def _receiver(self, websocket):
+        while True:
+            try:
+                received = await websocket.recv()
+                if type(received) is not bytes:
+                    received = received.encode('utf-8')
+                self._rx_buf += received
+                self.rx_ready.set()
+                # print(f"WebSocketSerial: Received {received}")
+            except websockets.exceptions.ConnectionClosedOK:
+                print("WebSocketSerial: Server closed connection gracefully (recv).")
+                break
+            except websockets.exceptions.ConnectionClosedError as e:
+                print(f"WebSocketSerial: Server closed connection unexpectedly (recv): {e}")
+                break
+            except Exception as e:
+                print(f"WebSocketSerial: Error during receive: {e}")
+                break
+
+    async def _run(self):
+        try:
+            async with websockets.connect(self.url) as websocket:
+                print(f"WebSocketSerial: Connected to {self.url}")
+                self._is_open = True
+                self._connected.set()
+
+                # whichever side stops first ends the connection
+                sender = asyncio.ensure_future(self._sender(websocket))
+                receiver = asyncio.ensure_future(self._receiver(websocket))
+                try:
+                    await asyncio.wait([sender, receiver], return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    sender.cancel()
+                    receiver.cancel()
+
+        # except websockets.exceptions.ConnectionRefusedError:
+            # print(f"WebSocketSerial: Connection refused to {self.url}")
+        except Exception as e:
+            print(f"WebSocketSerial: Error in WebSocket loop: {e}")
+        finally:
+            self._is_open = False
+            self._connected.set()
+            self.rx_ready.set()
+            print(f"WebSocketSerial: WebSocket loop finished.")
 
-    def open(self):
-        if self._is_open or self._thread:
+    async def open(self):
+        if self._is_open or self._task:
             return
-        self._stop_event.clear()
-        self._thread = threading.Thread(target=self._run_websocket_loop, daemon=True)
-        self._thread.start()
-        # Wait for a short time to allow connection attempt
-        import time
-        time.sleep(0.1)
-        if not self._is_open and not self._stop_event.is_set():
+        self.rx_ready = asyncio.Event()
+        self._write_queue = asyncio.Queue()
+        self._connected = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+        # _run sets _connected as soon as the attempt succeeds or fails
+        try:
+            await asyncio.wait_for(self._connected.wait(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            pass
+        if not self._is_open:
+            self._task.cancel()
+            self._task = None
             raise serial.SerialException(f"Failed to open WebSocket connection to {self.url}")
 
     def is_open(self):
         return self._is_open
 
     def close(self):
-        if self._is_open or self._thread:
-            self._stop_event.set()
-            if self._event_loop and not self._event_loop.is_closed():
-                self._event_loop.call_soon_threadsafe(self._event_loop.stop)
-            if self._thread and self._thread.is_alive():
-                self._thread.join(timeout=1)
-            self._thread = None
+        if self._is_open or self._task:
+            if self._task is not None:
+                self._task.cancel()
+            self._task = None
             self._is_open = False
-            print(f"WebSocketThread: Closed.")
+            self.rx_ready.set()
+            print(f"WebSocketSerial: Closed.")
 
     def write(self, data):
         if not self._is_open:
             raise serial.SerialException("Port is not open")
         if isinstance(data, str):
             data = data.encode('utf-8')
-        self._write_queue.put(data)
+        self._write_queue.put_nowait(data)
         return len(data)
 
-    def read(self, size=1):
-        if not self._is_open:
-            raise serial.SerialException("Port is not open")
-        data = b''
+    async def _wait(self, deadline):
+        # Wait until the receiver signals new data or the deadline passes.
+        # Returns False on timeout or if the connection has gone away.
+        self.rx_ready.clear()
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - asyncio.get_event_loop().time()
+            if timeout <= 0:
+                return False
         try:
-            for _ in range(size):
-                byte = self._read_queue.get(timeout=self.timeout)
-                data += byte
-        except queue.Empty:
-            pass
+            await asyncio.wait_for(self.rx_ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self._is_open
+
+    def _take(self, size):
+        data = bytes(self._rx_buf[:size])
+        del self._rx_buf[:size]
         return data
 
-    def readline(self, size=-1):
+    def _deadline(self):
+        if self.timeout is None:
+            return None
+        return asyncio.get_event_loop().time() + self.timeout
+
+    async def read(self, size=1):
         if not self._is_open:
             raise serial.SerialException("Port is not open")
-        line = b''
+        deadline = self._deadline()
+        while len(self._rx_buf) < size:
+            if not await self._wait(deadline):
+                break
+        return self._take(size)
+
+    async def readline(self, size=-1):
+        if not self._is_open:
+            raise serial.SerialException("Port is not open")
+        deadline = self._deadline()
+        start = 0
         while True:
-            try:
-                byte = self._read_queue.get(timeout=self.timeout)
-                line += byte
-                if byte == b'\n':
-                    break
-                if size != -1 and len(line) >= size:
-                    break
-            except queue.Empty:
+            idx = self._rx_buf.find(b'\n', start)
+            if idx >= 0:
+                end = idx + 1
+                if size != -1:
+                    end = min(end, size)
+                return self._take(end)
+            if size != -1 and len(self._rx_buf) >= size:
+                return self._take(size)
+            # only newly received bytes need scanning next time round
+            start = len(self._rx_buf)
+            if not await self._wait(deadline):
                 break
-        return line
+        return self._take(len(self._rx_buf) if size == -1 else size)
 
+    def read_available(self, size=None):
+        """Return up to size buffered bytes (all of them if None) without waiting."""
+        if not self._is_open:
+            raise serial.SerialException("Port is not open")
+        self.rx_ready.clear()
+        return self._take(len(self._rx_buf) if size is None else size)
+
+    @property
     def in_waiting(self):
-        return self._read_queue.qsize()
+        return len(self._rx_buf)
 
     @property
     def port(self):
@@ -173,35 +218,36 @@ class WebSocketSerialThreaded:
 
 # Example Usage (requires a running WebSocket server):
 if __name__ == "__main__":
-    import time
-
-    try:
-        ws_serial = WebSocketSerialThreaded("ws://localhost:8765", timeout=10000)
-        ws_serial.open()
-
-        if ws_serial.is_open():
-            ws_serial.write(b"Hello from ThreadedWebSocketSerial!\n")
-            print("Main Thread: Sent data.")
-            time.sleep(0.5)
-
-            for _ in range(5):
-                line = ws_serial.readline()
-                if line:
-                    print(f"Main Thread: Received line: {line.decode('utf-8').strip()}")
-                time.sleep(0.2)
-
-            ws_serial.write(b"REQUEST_RESPONSE\n")
-            print("Main Thread: Sent request for response.")
-            response = ws_serial.readline()
-            if response:
-                print(f"Main Thread: Received response: {response.decode('utf-8').strip()}")
-
-            ws_serial.close()
-
-        else:
-            print("Main Thread: Failed to open WebSocketSerial.")
-
-    except serial.SerialException as e:
-        print(f"Main Thread: Serial exception: {e}")
-    except Exception as e:
-        print(f"Main Thread: An unexpected error occurred: {e}")
+    async def main():
+        try:
+            ws_serial = WebSocketSerialAsync("ws://localhost:8765", timeout=10)
+            await ws_serial.open()
+
+            if ws_serial.is_open():
+                ws_serial.write(b"Hello from WebSocketSerialAsync!\n")
+                print("Main: Sent data.")
+                await asyncio.sleep(0.5)
+
+                for _ in range(5):
+                    line = await ws_serial.readline()
+                    if line:
+                        print(f"Main: Received line: {line.decode('utf-8').strip()}")
+                    await asyncio.sleep(0.2)
+
+                ws_serial.write(b"REQUEST_RESPONSE\n")
+                print("Main: Sent request for response.")
+                response = await ws_serial.readline()
+                if response:
+                    print(f"Main: Received response: {response.decode('utf-8').strip()}")
+
+                ws_serial.close()
+
+            else:
+                print("Main: Failed to open WebSocketSerial.")
+
+        except serial.SerialException as e:
+            print(f"Main: Serial exception: {e}")
+        except Exception as e:
+            print(f"Main: An unexpected error occurred: {e}")
+
+    asyncio.get_event_loop().run_until_complete(main())